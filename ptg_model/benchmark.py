@@ -0,0 +1,335 @@
+"""
+benchmark.py
+------------
+Work-precision benchmark of ODE solvers on the standard PTG scenarios.
+
+Each scenario of the example notebook (hysteresis, acute calcium decline,
+chronic phosphate/calcitriol change) is solved once at high accuracy as a
+reference. Solvers and tolerances are then swept and the iPTH error is
+reported against the number of RHS calls and the wall time. `recommend`
+condenses the sweep into per-scenario presets in the format of
+`ptg_model.runner.SOLVER_PRESETS`.
+
+Run ``python -m ptg_model.benchmark`` to print the table and the presets.
+"""
+
+import json
+import time
+
+import numpy as np
+
+from ptg_model.model import deriv
+from ptg_model.parameters import steady_state, steadystate_pat
+from ptg_model.runner import run_observed
+from ptg_model.utils import smooth_pw
+
+C_OPT = 5.0  # mg/dL
+P_OPT = 3.6  # mg/dL
+D_OPT = 40.0  # ng/L
+
+CONSTANT = np.array([[0, 1], [1, 1]])
+
+
+def _healthy_baseline():
+    """Healthy steady state and its secretory cell mass."""
+    y0 = steady_state(C_OPT, C_OPT, D_OPT)
+    return y0, y0[0] + y0[1]
+
+
+def _patient_state(pth_pat, endpoints_d, endpoints_p):
+    """Patient steady state extended by the two calcium factors."""
+    y_pat = steadystate_pat(
+        C_OPT, P_OPT, D_OPT, C_OPT, P_OPT, D_OPT, pth_pat, endpoints_d, endpoints_p, 1.0
+    )
+    return np.append(y_pat, [1, 1])
+
+
+def _calcium_cycles(cycles=3):
+    """Calcium endpoints of the hysteresis protocol (Schwarz et al., 1998)."""
+    c_low = 0.85 * C_OPT
+    tau_drop = 10 / 60
+    a = (C_OPT - c_low) / (1 - np.exp(-0.5 / tau_drop))
+    c_drop = C_OPT - a * (1 - np.exp(-1 / tau_drop))
+    phases = [30 / 60, 70 / 60, 10 / 60]
+    x_points, y_points = [0.0], [C_OPT]
+    for k in range(cycles):
+        base = k * np.sum(phases)
+        x_points += [base + phases[0], base + np.sum(phases[:2]), base + np.sum(phases)]
+        y_points += [c_drop, c_drop, C_OPT]
+    return np.array([x_points, y_points])
+
+
+def hysteresis_scenario():
+    """Repeated induced hypocalcemia over 200 minutes."""
+    y0, s0 = _healthy_baseline()
+    tf = 200 / 60
+    y_pat = np.array(y0 + [1, 1])
+    endpoints_c = _calcium_cycles()
+    base = (CONSTANT, CONSTANT, C_OPT, D_OPT, P_OPT)
+    rest = (P_OPT, D_OPT, s0, tf, 1.0, y_pat)
+
+    def fun(t, y):
+        return deriv(t, y, *base, smooth_pw(t, endpoints_c, 60), *rest)
+
+    return {
+        "fun": fun,
+        "t_span": (0, tf),
+        "y0": y_pat,
+        "t_eval": np.linspace(0, tf, 201),
+    }
+
+
+def acute_scenario():
+    """Exponential 10% calcium decline over two hours."""
+    _, s0 = _healthy_baseline()
+    tf = 2.0
+    y_pat = _patient_state(36.9, CONSTANT, CONSTANT)
+    base = (CONSTANT, CONSTANT, C_OPT, D_OPT, P_OPT)
+    rest = (P_OPT, D_OPT, s0, tf, 1.0, y_pat)
+
+    def fun(t, y):
+        c_dynamic = 0.9 * C_OPT + 0.1 * C_OPT * np.exp(-t / (0.2 / 3))
+        return deriv(t, y, *base, c_dynamic, *rest)
+
+    return {
+        "fun": fun,
+        "t_span": (0, tf),
+        "y0": y_pat,
+        "t_eval": np.linspace(0, tf, 121),
+    }
+
+
+def chronic_scenario():
+    """Phosphate +20% and calcitriol -50% after three months, two-year horizon."""
+    _, s0 = _healthy_baseline()
+    tm = 24 * 30 * 24
+    t_step = 24 * 30 * 3 / tm
+    endpoints_p = np.array([[0, t_step / 2, t_step, 1], [1, 1, 1.2, 1.2]])
+    endpoints_d = np.array([[0, t_step / 2, t_step, 1], [1, 1, 0.5, 0.5]])
+    y_pat = _patient_state(31.7, endpoints_d, endpoints_p)
+    args = (
+        endpoints_p,
+        endpoints_d,
+        C_OPT,
+        D_OPT,
+        P_OPT,
+        C_OPT,
+        P_OPT,
+        D_OPT,
+        s0,
+        tm,
+        1.0,
+        y_pat,
+    )
+
+    def fun(t, y):
+        return deriv(t, y, *args)
+
+    return {
+        "fun": fun,
+        "t_span": (0, tm),
+        "y0": y_pat,
+        "t_eval": np.linspace(0, tm, 25),
+    }
+
+
+SCENARIOS = {
+    "hysteresis": hysteresis_scenario,
+    "acute": acute_scenario,
+    "chronic": chronic_scenario,
+}
+
+
+def reference_solution(scenario, method="LSODA", rtol=1e-10, atol=1e-12):
+    """
+    Compute a high-accuracy iPTH reference on the scenario output grid.
+
+    Parameters
+    ----------
+    scenario : dict
+        Scenario as returned by one of the `SCENARIOS` builders.
+    method, rtol, atol : optional
+        Solver settings of the reference run. LSODA is the default because
+        BDF and Radau become very expensive on the chronic scenario at
+        tolerances below 1e-8.
+
+    Returns
+    -------
+    ndarray
+        iPTH (``y[3]``) on ``scenario['t_eval']``.
+    """
+    sol = run_observed(
+        scenario["fun"],
+        scenario["t_span"],
+        scenario["y0"],
+        scenario["t_eval"],
+        method=method,
+        rtol=rtol,
+        atol=atol,
+    )
+    if not sol.success:
+        raise RuntimeError(f"Reference solution failed: {sol.message}")
+    return sol.y[0]
+
+
+def _counted(fun):
+    """Wrap a RHS so that every call is counted in ``wrapper.calls``."""
+
+    def wrapper(t, y):
+        wrapper.calls += 1
+        return fun(t, y)
+
+    wrapper.calls = 0
+    return wrapper
+
+
+def work_precision(
+    scenarios=None,
+    methods=("BDF", "Radau", "LSODA"),
+    rtols=(1e-3, 1e-4, 1e-5, 1e-6, 1e-7),
+    atols=(1e-6, 1e-8),
+):
+    """
+    Sweep solvers and tolerances and measure iPTH error against cost.
+
+    Parameters
+    ----------
+    scenarios : sequence of str, optional
+        Names from `SCENARIOS`. Default is all.
+    methods : sequence of str, optional
+        Solver names accepted by `ptg_model.runner.run_observed`.
+    rtols, atols : sequence of float, optional
+        Tolerances to combine.
+
+    Returns
+    -------
+    list of dict
+        One row per run with keys 'scenario', 'method', 'rtol', 'atol',
+        'error' (max relative iPTH error), 'nfev', 'njev', 'nlu' and 'time'.
+        'nfev' counts the actual calls of the RHS. Unlike the solvers' own
+        ``nfev`` it includes the finite-difference Jacobians of BDF and Radau,
+        so it is comparable with LSODA.
+    """
+    rows = []
+    for name in scenarios or SCENARIOS:
+        scenario = SCENARIOS[name]()
+        reference = reference_solution(scenario)
+        for method in methods:
+            for rtol in rtols:
+                for atol in atols:
+                    fun = _counted(scenario["fun"])
+                    start = time.perf_counter()
+                    sol = run_observed(
+                        fun,
+                        scenario["t_span"],
+                        scenario["y0"],
+                        scenario["t_eval"],
+                        method=method,
+                        rtol=rtol,
+                        atol=atol,
+                    )
+                    elapsed = time.perf_counter() - start
+                    error = (
+                        np.max(np.abs(sol.y[0] - reference) / np.abs(reference))
+                        if sol.success
+                        else np.inf
+                    )
+                    rows.append(
+                        {
+                            "scenario": name,
+                            "method": method,
+                            "rtol": rtol,
+                            "atol": atol,
+                            "error": float(error),
+                            "nfev": fun.calls,
+                            "njev": sol.njev,
+                            "nlu": sol.nlu,
+                            "time": elapsed,
+                        }
+                    )
+    return rows
+
+
+def recommend(rows, max_error=1e-4, cost="nfev"):
+    """
+    Pick the cheapest configuration per scenario that meets an accuracy target.
+
+    Parameters
+    ----------
+    rows : list of dict
+        Output of `work_precision`.
+    max_error : float, optional
+        Largest accepted relative iPTH error. Default is 1e-4.
+    cost : {'nfev', 'time'}, optional
+        Cost measure to minimise. Default is the number of RHS calls.
+
+    Returns
+    -------
+    dict
+        ``{scenario: {'method': ..., 'rtol': ..., 'atol': ...}}``, usable as
+        `ptg_model.runner.SOLVER_PRESETS`. Scenarios where no configuration
+        meets `max_error` fall back to the most accurate one.
+    """
+    presets = {}
+    for name in dict.fromkeys(row["scenario"] for row in rows):
+        candidates = [row for row in rows if row["scenario"] == name]
+        accurate = [row for row in candidates if row["error"] <= max_error]
+        if accurate:
+            best = min(accurate, key=lambda row: row[cost])
+        else:
+            best = min(candidates, key=lambda row: row["error"])
+        presets[name] = {
+            "method": best["method"],
+            "rtol": best["rtol"],
+            "atol": best["atol"],
+        }
+    return presets
+
+
+def format_table(rows):
+    """Format work-precision rows as a plain-text table."""
+    header = f"{'scenario':<11}{'method':<7}{'rtol':>8}{'atol':>8}{'error':>11}{'nfev':>8}{'time [s]':>10}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['scenario']:<11}{row['method']:<7}{row['rtol']:>8.0e}{row['atol']:>8.0e}"
+            f"{row['error']:>11.2e}{row['nfev']:>8d}{row['time']:>10.3f}"
+        )
+    return "\n".join(lines)
+
+
+def plot_work_precision(rows, cost="nfev"):
+    """
+    Plot iPTH error against cost, one panel per scenario and one line per solver.
+
+    Returns
+    -------
+    matplotlib.figure.Figure
+    """
+    import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+    names = list(dict.fromkeys(row["scenario"] for row in rows))
+    fig, axes = plt.subplots(1, len(names), figsize=(5 * len(names), 4), squeeze=False)
+    for ax, name in zip(axes[0], names):
+        for method in dict.fromkeys(row["method"] for row in rows):
+            sel = [r for r in rows if r["scenario"] == name and r["method"] == method]
+            sel.sort(key=lambda r: r[cost])
+            ax.loglog(
+                [r[cost] for r in sel],
+                [max(r["error"], 1e-16) for r in sel],
+                "o-",
+                label=method,
+            )
+        ax.set_xlabel("RHS calls" if cost == "nfev" else "Time [s]")
+        ax.set_ylabel("Max relative iPTH error")
+        ax.set_title(name)
+        ax.grid(True)
+        ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+if __name__ == "__main__":
+    results = work_precision()
+    print(format_table(results))
+    print(json.dumps(recommend(results), indent=4))
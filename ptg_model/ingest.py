@@ -0,0 +1,334 @@
+"""
+ingest.py
+---------
+Streaming ingestion of longitudinal lab data into PTG model inputs.
+
+Lab exports in long format (one row per measurement with patient id, time,
+analyte and value) are read row by row from CSV (optionally gzip-compressed)
+or in record batches from Parquet, grouped by patient, and converted into the
+(2, N) endpoint arrays consumed by `smooth_pw` and `deriv`. Each patient is
+baselined with `steadystate_pat` and yielded as soon as its last row has been
+read, so simulation of one patient can overlap with reading the next.
+
+The file must be sorted (or at least grouped) by patient. Times are either
+numbers in hours or ISO 8601 timestamps (UTC unless they carry an offset);
+values are expected in model units (calcium and phosphate in mg/dL,
+calcitriol in ng/L, PTH in pg/mL).
+"""
+
+import csv
+import gzip
+import queue
+import threading
+import warnings
+from datetime import datetime, timezone
+from itertools import groupby
+
+import numpy as np
+
+from ptg_model.parameters import steady_state, steadystate_pat
+
+DEFAULT_COLUMNS = {
+    "patient_id": "patient_id",
+    "time": "time",
+    "analyte": "analyte",
+    "value": "value",
+}
+
+# Raw analyte labels (lower case) and the model input they describe.
+DEFAULT_ANALYTES = {
+    "calcium": "calcium",
+    "ca": "calcium",
+    "phosphate": "phosphate",
+    "p": "phosphate",
+    "calcitriol": "calcitriol",
+    "1,25d": "calcitriol",
+    "pth": "pth",
+    "ipth": "pth",
+    "gfr": "gfr",
+}
+
+
+def _parse_time(value):
+    """Convert a number (hours) or an ISO 8601 timestamp to hours; naive timestamps are UTC."""
+    if not isinstance(value, datetime):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            value = datetime.fromisoformat(str(value))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp() / 3600
+
+
+def _read_csv(path, columns):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", newline="") as handle:
+        for row in csv.DictReader(handle):
+            yield tuple(row[columns[key]] for key in DEFAULT_COLUMNS)
+
+
+def _read_parquet(path, columns, chunksize):
+    try:
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise ImportError("Reading Parquet files requires pyarrow.") from exc
+    names = [columns[key] for key in DEFAULT_COLUMNS]
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=names):
+        yield from zip(*(batch.column(name).to_pylist() for name in names))
+
+
+def read_measurements(path, columns=None, analytes=None, chunksize=65536):
+    """
+    Stream measurements from a long-format CSV or Parquet export.
+
+    Parameters
+    ----------
+    path : str or path-like
+        File ending in .parquet/.pq or CSV, optionally .gz. Parquet needs
+        the optional dependency pyarrow; its time column may hold numbers,
+        strings or timestamps (naive timestamps are UTC).
+    columns : dict, optional
+        Column names for 'patient_id', 'time', 'analyte' and 'value'.
+    analytes : dict, optional
+        Lower-case raw analyte labels mapped to 'calcium', 'phosphate',
+        'calcitriol', 'pth' or 'gfr'. Rows with other labels or empty values
+        are skipped. Default is `DEFAULT_ANALYTES`. Non-numeric values such as
+        censored results ('<5') are skipped as well, with one warning at the
+        end of the file.
+    chunksize : int, optional
+        Rows per Parquet record batch. CSV files are streamed row by row by
+        `csv.DictReader`, so their memory use does not depend on the file size
+        and `chunksize` does not apply.
+
+    Yields
+    ------
+    tuple
+        (patient_id, time in hours, analyte, value).
+    """
+    columns = {**DEFAULT_COLUMNS, **(columns or {})}
+    analytes = DEFAULT_ANALYTES if analytes is None else analytes
+    if str(path).endswith((".parquet", ".pq")):
+        rows = _read_parquet(path, columns, chunksize)
+    else:
+        rows = _read_csv(path, columns)
+    n_censored, example = 0, None
+    for patient_id, time, analyte, value in rows:
+        analyte = analytes.get(str(analyte).strip().lower())
+        if analyte is None or value is None or value == "":
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            n_censored += 1
+            example = example or value
+            continue
+        yield str(patient_id), _parse_time(time), analyte, number
+    if n_censored:
+        warnings.warn(f"Skipped {n_censored} non-numeric values, e.g. {example!r}.")
+
+
+def series_endpoints(times, values, tm, baseline):
+    """
+    Convert a measurement series into a (2, N) endpoint array.
+
+    Times (hours since the patient's first measurement) are normalised by `tm`
+    and values by `baseline`. Repeated times are averaged, and the profile is
+    held flat from 0 to the first and from the last measurement to 1.
+
+    Returns
+    -------
+    ndarray
+        Endpoints of shape (2, N) with N >= 2; a constant profile if the series
+        is empty.
+    """
+    if len(times) == 0:
+        return np.array([[0.0, 1.0], [1.0, 1.0]])
+    x, inverse = np.unique(np.asarray(times, dtype=float) / tm, return_inverse=True)
+    y = np.bincount(inverse, weights=values) / np.bincount(inverse) / baseline
+    if x[0] > 0:
+        x, y = np.r_[0.0, x], np.r_[y[0], y]
+    if x[-1] < 1:
+        x, y = np.r_[x, 1.0], np.r_[y, y[-1]]
+    return np.array([x, y])
+
+
+def build_patient(
+    patient_id,
+    measurements,
+    tm=None,
+    copt=5.0,
+    popt=3.6,
+    dopt=40.0,
+    gfr_ref=100.0,
+    baseline_window=24 * 30,
+):
+    """
+    Build a ready-to-simulate patient from its measurements.
+
+    Parameters
+    ----------
+    patient_id : str
+        Patient identifier.
+    measurements : iterable of tuple
+        (time in hours, analyte, value) rows of one patient.
+    tm : float, optional
+        Simulation horizon in hours; default is the span of the data.
+    copt, popt, dopt : float, optional
+        Healthy calcium, phosphate and calcitriol levels.
+    gfr_ref : float, optional
+        GFR corresponding to normal clearance (``gfr_in = 1``).
+    baseline_window : float, optional
+        Each analyte's baseline is the mean of its measurements within this
+        many hours after the first measurement of that analyte. An analyte
+        first measured late is therefore baselined on its own first month,
+        and its profile is held at its first value back to t=0. Missing
+        calcium, phosphate, calcitriol or GFR fall back to the healthy
+        values.
+
+    Returns
+    -------
+    dict or None
+        ``None`` if the patient has no PTH measurement. Otherwise a dict with
+        'patient_id', 'model' (keyword arguments of `deriv`, including
+        'endpoints_p', 'endpoints_d' and the initial state 'y_pat'),
+        'endpoints_c' (calcium profile relative to 'c_pat'), 't0' (hours of
+        the first measurement) and 'observed' (analyte -> (2, N) array of
+        hours since 't0' and raw values).
+    """
+    rows = sorted(measurements)
+    if not rows:
+        return None
+    t0 = rows[0][0]
+    series = {}
+    for time, analyte, value in rows:
+        series.setdefault(analyte, ([], []))
+        series[analyte][0].append(time - t0)
+        series[analyte][1].append(value)
+    if "pth" not in series:
+        return None
+
+    span = max(time for time, _, _ in rows) - t0
+    tm = tm or max(span, 24.0)
+
+    def baseline(analyte, default):
+        if analyte not in series:
+            return default
+        times, values = map(np.asarray, series[analyte])
+        in_window = times <= times[0] + baseline_window
+        return float(np.mean(values[in_window]))
+
+    c_pat = baseline("calcium", copt)
+    p_pat = baseline("phosphate", popt)
+    d_pat = baseline("calcitriol", dopt)
+    pth_pat = baseline("pth", None)
+    gfr_in = baseline("gfr", gfr_ref) / gfr_ref
+
+    def endpoints(analyte, base):
+        times, values = series.get(analyte, ([], []))
+        return series_endpoints(times, values, tm, base)
+
+    endpoints_p = endpoints("phosphate", p_pat)
+    endpoints_d = endpoints("calcitriol", d_pat)
+    y_pat = steadystate_pat(
+        c_pat, p_pat, d_pat, copt, popt, dopt, pth_pat, endpoints_d, endpoints_p, gfr_in
+    )
+    y0 = steady_state(copt, copt, dopt)
+
+    return {
+        "patient_id": patient_id,
+        "model": {
+            "endpoints_p": endpoints_p,
+            "endpoints_d": endpoints_d,
+            "copt": copt,
+            "dopt": dopt,
+            "popt": popt,
+            "c_pat": c_pat,
+            "p_pat": p_pat,
+            "d_pat": d_pat,
+            "s0": y0[0] + y0[1],
+            "tm": tm,
+            "gfr_in": gfr_in,
+            "y_pat": np.append(y_pat, [1, 1]),
+        },
+        "endpoints_c": endpoints("calcium", c_pat),
+        "t0": t0,
+        "observed": {key: np.array(value) for key, value in series.items()},
+    }
+
+
+def _patients(path, columns, analytes, chunksize, **kwargs):
+    seen = set()
+    rows = read_measurements(path, columns, analytes, chunksize)
+    for patient_id, group in groupby(rows, key=lambda row: row[0]):
+        if patient_id in seen:
+            raise ValueError(
+                f"Rows of patient {patient_id} are not contiguous; sort the file by patient."
+            )
+        seen.add(patient_id)
+        patient = build_patient(patient_id, (row[1:] for row in group), **kwargs)
+        if patient is None:
+            warnings.warn(f"Skipping patient {patient_id}: no PTH measurement.")
+            continue
+        yield patient
+
+
+def iter_patients(
+    path, columns=None, analytes=None, chunksize=65536, prefetch=0, **kwargs
+):
+    """
+    Lazily yield ready patients from a lab export.
+
+    Parameters
+    ----------
+    path : str or path-like
+        Long-format CSV or Parquet file grouped by patient.
+    columns, analytes, chunksize : optional
+        See `read_measurements`.
+    prefetch : int, optional
+        If positive, read and baseline up to this many patients ahead in a
+        background thread while the caller simulates the current one.
+    **kwargs
+        Passed to `build_patient` (tm, copt, popt, dopt, gfr_ref,
+        baseline_window).
+
+    Yields
+    ------
+    dict
+        Patients as returned by `build_patient`. Patients without PTH are
+        skipped with a warning.
+    """
+    patients = _patients(path, columns, analytes, chunksize, **kwargs)
+    if prefetch <= 0:
+        yield from patients
+        return
+
+    buffer = queue.Queue(maxsize=prefetch)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for patient in patients:
+                if stop.is_set():
+                    return
+                buffer.put(patient)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            buffer.put(exc)
+        buffer.put(done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while (item := buffer.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Unblock the producer if the caller stopped early.
+        stop.set()
+        while thread.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
@@ -0,0 +1,336 @@
+"""
+optimizer.py
+------------
+Search for calcitriol and phosphate-binder schedules that keep iPTH in a target
+range while limiting gland growth (``y[20]``) and treatment burden.
+
+A schedule is a pair of knot vectors (calcitriol and phosphate multipliers of
+the patient's untreated levels at the start) that is turned into the ``endpoints_d`` and
+``endpoints_p`` profiles consumed by `ptg_model.model.deriv`. Candidates are
+simulated in stages of increasing horizon; after every stage a candidate is
+dropped if
+
+- its gland growth already exceeds the limit (``y[20]`` never decreases), or
+- its partial PTH cost, a lower bound of the final cost, together with its
+  exactly known burden is dominated by the current Pareto front.
+
+Survivors continue from their stored state, so pruning never repeats work.
+The search is warm-started from user-supplied schedules and refined around the
+front by perturbing single knots.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+
+from ptg_model.model import deriv
+from ptg_model.runner import SOLVER_PRESETS, run_observed
+from ptg_model.utils import smooth_pw
+
+# KDIGO target range for dialysis patients: 2-9x the upper normal limit (65 pg/mL).
+PTH_TARGET = (130.0, 585.0)
+
+
+def pth_pg_ml(ipth):
+    """Convert the model iPTH state ``y[3]`` to pg/mL."""
+    return np.asarray(ipth) * 9.434 / 3
+
+
+def schedule_endpoints(levels):
+    """
+    Convert knot multipliers into a (2, N) endpoint array for `smooth_pw`.
+
+    The profile starts at the untreated level 1 at x=0 and passes linearly
+    through the given levels at equally spaced knots up to x=1.
+    """
+    levels = np.asarray(levels, dtype=float)
+    return np.array([np.linspace(0, 1, levels.size + 1), np.r_[1.0, levels]])
+
+
+def treatment_burden(levels_d, levels_p, d_bounds=(1.0, 2.0), p_bounds=(0.6, 1.0)):
+    """
+    Normalised treatment burden of a schedule.
+
+    Mean calcitriol level above ``d_bounds[0]`` and mean phosphate level
+    below ``p_bounds[1]``, each scaled by the width of its admissible range,
+    so the burden lies in [0, 2].
+    """
+    d_load = np.mean(np.asarray(levels_d) - d_bounds[0]) / (d_bounds[1] - d_bounds[0])
+    p_load = np.mean(p_bounds[1] - np.asarray(levels_p)) / (p_bounds[1] - p_bounds[0])
+    return float(d_load + p_load)
+
+
+def pth_penalty(pth, target=PTH_TARGET):
+    """Squared log distance of iPTH (pg/mL) to the target range, zero inside it."""
+    low, high = target
+    pth = np.asarray(pth, dtype=float)
+    return np.where(pth > high, np.log(pth / high) ** 2, 0) + np.where(
+        pth < low, np.log(low / pth) ** 2, 0
+    )
+
+
+def pareto_front(points):
+    """
+    Indices of the non-dominated points when minimising every column.
+
+    Parameters
+    ----------
+    points : array_like
+        Array of shape (n, k).
+
+    Returns
+    -------
+    list of int
+    """
+    points = np.asarray(points, dtype=float)
+    front = []
+    for i, p in enumerate(points):
+        if not np.any(np.all(points <= p, axis=1) & np.any(points < p, axis=1)):
+            front.append(i)
+    return front
+
+
+def _advance(task):
+    """Simulate one candidate from `t_from` to `t_to`; runs in a worker process."""
+    patient, levels_d, levels_p, t_from, t_to, y_from, t_eval, solver = task
+    args = (schedule_endpoints(levels_p), schedule_endpoints(levels_d))
+    sol = run_observed(
+        lambda t, y: deriv(t, y, *args, **patient),
+        (t_from, t_to),
+        y_from,
+        t_eval,
+        **solver,
+    )
+    return sol.success, pth_pg_ml(sol.y[0]), sol.y_stop
+
+
+def _neighbours(schedule, n, step, d_bounds, p_bounds, rng):
+    """Perturb a single knot of a schedule by +-step, `n` times."""
+    levels_d, levels_p = schedule
+    out = []
+    for _ in range(n):
+        new_d, new_p = np.array(levels_d, dtype=float), np.array(levels_p, dtype=float)
+        k = rng.integers(new_d.size)
+        if rng.random() < 0.5:
+            delta = rng.choice([-1, 1]) * step * (d_bounds[1] - d_bounds[0])
+            new_d[k] = np.clip(new_d[k] + delta, *d_bounds)
+        else:
+            delta = rng.choice([-1, 1]) * step * (p_bounds[1] - p_bounds[0])
+            new_p[k] = np.clip(new_p[k] + delta, *p_bounds)
+        out.append((new_d, new_p))
+    return out
+
+
+def random_schedules(n, n_knots, d_bounds=(1.0, 2.0), p_bounds=(0.6, 1.0), seed=None):
+    """Draw `n` schedules with knot levels uniformly distributed within the bounds."""
+    rng = np.random.default_rng(seed)
+    return [
+        (rng.uniform(*d_bounds, n_knots), rng.uniform(*p_bounds, n_knots))
+        for _ in range(n)
+    ]
+
+
+def optimize_schedules(
+    patient,
+    candidates,
+    target=PTH_TARGET,
+    max_growth=1.1,
+    stages=(0.25, 0.5, 1.0),
+    n_eval=None,
+    d_bounds=(1.0, 2.0),
+    p_bounds=(0.6, 1.0),
+    refine_rounds=2,
+    n_neighbours=8,
+    step=0.1,
+    batch_size=32,
+    workers=1,
+    solver=None,
+    seed=None,
+):
+    """
+    Find the Pareto front of PTH control versus treatment burden.
+
+    Parameters
+    ----------
+    patient : dict
+        Keyword arguments of `ptg_model.model.deriv`: copt, dopt, popt, c_pat,
+        p_pat, d_pat, s0, tm, gfr_in and y_pat (23 states, also used as the
+        initial state), e.g. the 'model' entry of a patient from
+        `ptg_model.ingest.iter_patients`. Endpoints in it are replaced by the
+        schedules, whose levels are multipliers of the inputs at t=0 (where
+        `y_pat` is at rest), i.e. of ``p_pat * smooth_pw(0, endpoints_p)``
+        and likewise for calcitriol. The horizon is `tm`.
+    candidates : list of tuple
+        Schedules ``(levels_d, levels_p)`` of equal length, e.g. from
+        `random_schedules`. Put warm-start schedules (a previous optimum or a
+        nearby patient's front) first; they seed the front and sharpen pruning.
+    target : tuple of float, optional
+        iPTH target range in pg/mL. Default is `PTH_TARGET`.
+    max_growth : float, optional
+        Largest admissible ratio of final to initial gland mass ``y[20]``.
+    stages : sequence of float, optional
+        Fractions of the horizon after which candidates are pruned.
+    n_eval : int, optional
+        Number of monthly-spaced output points; default is one per 30 days.
+    d_bounds, p_bounds : tuple of float, optional
+        Admissible calcitriol and phosphate multipliers.
+    refine_rounds : int, optional
+        Rounds of local search around the front after the initial candidates.
+    n_neighbours : int, optional
+        Neighbours generated per front member and round.
+    step : float, optional
+        Knot perturbation as a fraction of the admissible range.
+    batch_size : int, optional
+        Candidates evaluated together; the front is updated between batches.
+    workers : int, optional
+        Number of worker processes. Default 1 evaluates in-process.
+    solver : dict, optional
+        Solver settings for `run_observed`. Default is the 'chronic' preset.
+    seed : int, optional
+        Seed of the refinement random generator.
+
+    Returns
+    -------
+    OptimizeResult
+        ``front`` (list of dicts with 'levels_d', 'levels_p', 'endpoints_d',
+        'endpoints_p', 'control', 'burden' and 'gland_growth', sorted by
+        burden; the endpoints are relative to the given `p_pat` and `d_pat`), ``n_evaluated`` (simulated over the full horizon),
+        ``n_pruned`` (dropped after a partial horizon) and ``n_failed``.
+    """
+    # Schedules are relative to the inputs at t=0, where y_pat is at rest.
+    start_p = (
+        float(smooth_pw(0, patient["endpoints_p"])) if "endpoints_p" in patient else 1.0
+    )
+    start_d = (
+        float(smooth_pw(0, patient["endpoints_d"])) if "endpoints_d" in patient else 1.0
+    )
+    patient = {
+        key: value
+        for key, value in patient.items()
+        if key not in ("endpoints_p", "endpoints_d")
+    }
+    patient["p_pat"] = start_p * patient["p_pat"]
+    patient["d_pat"] = start_d * patient["d_pat"]
+    tm = patient["tm"]
+    y_pat = np.asarray(patient["y_pat"], dtype=float)
+    solver = dict(SOLVER_PRESETS["chronic"] if solver is None else solver)
+    n_eval = n_eval or max(int(round(tm / (24 * 30))), 1) + 1
+    t_grid = np.linspace(0, tm, n_eval)
+    t_stages = [0.0] + [fraction * tm for fraction in stages]
+    rng = np.random.default_rng(seed)
+
+    front = []
+    stats = {"n_evaluated": 0, "n_pruned": 0, "n_failed": 0}
+
+    def dominated(control, burden):
+        # Strict Pareto dominance, as in `pareto_front`: ties survive.
+        return any(
+            f["burden"] <= burden
+            and f["control"] <= control
+            and (f["burden"] < burden or f["control"] < control)
+            for f in front
+        )
+
+    def run_batch(batch, executor):
+        alive = [
+            {
+                "levels_d": np.asarray(levels_d, dtype=float),
+                "levels_p": np.asarray(levels_p, dtype=float),
+                "burden": treatment_burden(levels_d, levels_p, d_bounds, p_bounds),
+                "penalty": 0.0,
+                "y": y_pat,
+            }
+            for levels_d, levels_p in batch
+        ]
+        for stage, (t_from, t_to) in enumerate(zip(t_stages[:-1], t_stages[1:])):
+            final = stage == len(t_stages) - 2
+            first = 0 if t_from == 0 else np.searchsorted(t_grid, t_from, side="right")
+            t_eval = t_grid[first : np.searchsorted(t_grid, t_to, side="right")]
+            tasks = [
+                (
+                    patient,
+                    c["levels_d"],
+                    c["levels_p"],
+                    t_from,
+                    t_to,
+                    c["y"],
+                    t_eval,
+                    solver,
+                )
+                for c in alive
+            ]
+            mapper = executor.map if executor is not None else map
+            survivors = []
+            for c, (success, pth, y_to) in zip(alive, mapper(_advance, tasks)):
+                if not success:
+                    stats["n_failed"] += 1
+                    continue
+                c["penalty"] += float(np.sum(pth_penalty(pth, target)))
+                c["y"] = y_to
+                c["control"] = c["penalty"] / n_eval
+                c["gland_growth"] = y_to[20] / y_pat[20]
+                if final:
+                    stats["n_evaluated"] += 1
+                    if c["gland_growth"] <= max_growth:
+                        survivors.append(c)
+                elif c["gland_growth"] > max_growth or dominated(
+                    c["control"], c["burden"]
+                ):
+                    stats["n_pruned"] += 1
+                else:
+                    survivors.append(c)
+            alive = survivors
+
+        pool = front + [
+            {
+                "levels_d": c["levels_d"],
+                "levels_p": c["levels_p"],
+                "endpoints_d": schedule_endpoints(c["levels_d"]) * [[1.0], [start_d]],
+                "endpoints_p": schedule_endpoints(c["levels_p"]) * [[1.0], [start_p]],
+                "control": c["control"],
+                "burden": c["burden"],
+                "gland_growth": c["gland_growth"],
+            }
+            for c in alive
+        ]
+        return [
+            pool[i] for i in pareto_front([[p["control"], p["burden"]] for p in pool])
+        ]
+
+    seen = set()
+
+    def unseen(schedules):
+        fresh = []
+        for levels_d, levels_p in schedules:
+            key = np.r_[levels_d, levels_p].round(12).tobytes()
+            if key not in seen:
+                seen.add(key)
+                fresh.append((levels_d, levels_p))
+        return fresh
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        queue = unseen(candidates)
+        for round_ in range(refine_rounds + 1):
+            for start in range(0, len(queue), batch_size):
+                front = run_batch(queue[start : start + batch_size], executor)
+            if round_ < refine_rounds:
+                queue = unseen(
+                    neighbour
+                    for f in front
+                    for neighbour in _neighbours(
+                        (f["levels_d"], f["levels_p"]),
+                        n_neighbours,
+                        step,
+                        d_bounds,
+                        p_bounds,
+                        rng,
+                    )
+                )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    front.sort(key=lambda f: f["burden"])
+    return OptimizeResult(front=front, **stats)
@@ -0,0 +1,440 @@
+"""
+runner.py
+---------
+Lean simulation driver for the PTG model.
+
+Instead of keeping every internal solver step (or a full dense interpolant) like
+`solve_ivp`, the solver is stepped manually and only the requested states or
+derived observables are written into a preallocated buffer on a fixed output
+grid. Memory per run is therefore bounded by ``len(observables) * len(t_eval)``
+and independent of the number of solver steps.
+
+Runs can stop early on threshold crossings (`threshold_event`) or once the
+model has settled (``steady_tol``), returning the stopping time and state.
+"""
+
+import numpy as np
+from scipy.integrate import BDF, DOP853, LSODA, RK23, RK45, Radau
+from scipy.optimize import OptimizeResult, brentq
+
+from ptg_model.extensions import CORE_STATES
+from ptg_model.model import deriv
+from ptg_model.utils import smooth_pw
+
+METHODS = {
+    "BDF": BDF,
+    "Radau": Radau,
+    "LSODA": LSODA,
+    "RK45": RK45,
+    "RK23": RK23,
+    "DOP853": DOP853,
+}
+
+# Named states of the core model, from the registry in `ptg_model.extensions`.
+STATE_INDEX = {name: index for index, name in enumerate(CORE_STATES)}
+
+# Fewest RHS calls (finite-difference Jacobians included) with a max relative
+# iPTH error below 1e-4 per scenario class, from `python -m ptg_model.benchmark`
+# (see `benchmark.recommend`).
+SOLVER_PRESETS = {
+    "hysteresis": {"method": "LSODA", "rtol": 1e-6, "atol": 1e-8},
+    "acute": {"method": "LSODA", "rtol": 1e-5, "atol": 1e-6},
+    "chronic": {"method": "BDF", "rtol": 1e-3, "atol": 1e-8},
+}
+
+
+def _state_index(spec, index=None):
+    """Resolve a state index or a name from `index` (default `STATE_INDEX`)."""
+    index = STATE_INDEX if index is None else index
+    if isinstance(spec, str):
+        if spec not in index:
+            raise ValueError(f"Unknown observable: {spec}")
+        return index[spec]
+    return int(spec)
+
+
+def _parse_observables(observables, index=None):
+    """Split observables into (column, state index) and (column, callable) pairs."""
+    state_names = {
+        i: name for name, i in (STATE_INDEX if index is None else index).items()
+    }
+    names, states, funcs = [], [], []
+    for col, spec in enumerate(observables):
+        if callable(spec):
+            names.append(getattr(spec, "__name__", f"obs{col}"))
+            funcs.append((col, spec))
+        else:
+            i = _state_index(spec, index)
+            names.append(state_names.get(i, f"y{i}"))
+            states.append((col, i))
+    return names, states, funcs
+
+
+def _record(out, start, t_batch, y_batch, states, funcs):
+    """Write observables evaluated at `t_batch` into columns ``start:`` of `out`."""
+    stop = start + len(t_batch)
+    if states:
+        cols, idx = zip(*states)
+        out[list(cols), start:stop] = y_batch[list(idx)]
+    for col, func in funcs:
+        out[col, start:stop] = [func(t, y_batch[:, k]) for k, t in enumerate(t_batch)]
+
+
+def threshold_event(observable, value, direction=0, terminal=True, index=None):
+    """
+    Build an event for an observable crossing a threshold.
+
+    Parameters
+    ----------
+    observable : int, str or callable
+        State index, name from `index`, or callable ``f(t, y)``.
+    value : float
+        Threshold, e.g. ``9 * normal_ipth``.
+    direction : {-1, 0, 1}, optional
+        Only trigger on decreasing (-1), increasing (1) or any (0) crossing.
+    terminal : bool, optional
+        Stop the integration at the crossing. Default is True.
+    index : dict, optional
+        Name-to-index map of the state vector, e.g. ``AssembledModel.index``
+        for a model with extensions. Default is `STATE_INDEX`.
+
+    Returns
+    -------
+    callable
+        Event function ``g(t, y, *args)`` with `terminal` and `direction`
+        attributes, usable with `run_observed` and `solve_ivp`.
+    """
+    if callable(observable):
+
+        def event(t, y, *_args):
+            return observable(t, y) - value
+
+    else:
+        state = _state_index(observable, index)
+
+        def event(_t, y, *_args):
+            return y[state] - value
+
+    event.terminal = terminal
+    event.direction = direction
+    return event
+
+
+def _bind_args(func, args):
+    """Bind extra arguments to ``func(t, y, *args)``, keeping event attributes."""
+
+    def bound(t, y):
+        return func(t, y, *args)
+
+    bound.terminal = getattr(func, "terminal", False)
+    bound.direction = getattr(func, "direction", 0)
+    return bound
+
+
+def _prepare_events(events, args):
+    """Return a list of events ``g(t, y)`` with `args` bound."""
+    if events is None:
+        return []
+    if callable(events):
+        events = [events]
+    return [_bind_args(event, args or ()) for event in events]
+
+
+def _find_events(events, g_old, g_new, sol, t_old, t):
+    """Return (time, event number) of all crossings inside (t_old, t], sorted by time."""
+    found = []
+    for i, event in enumerate(events):
+        up = g_old[i] <= 0 <= g_new[i]
+        down = g_old[i] >= 0 >= g_new[i]
+        direction = event.direction
+        if g_old[i] == g_new[i] or not (
+            (up and direction >= 0) or (down and direction <= 0)
+        ):
+            continue
+        t_root = brentq(lambda s, e=event: e(s, sol(s)), t_old, t, xtol=1e-12)
+        found.append((t_root, i))
+    return sorted(found)
+
+
+def _check_grid(t_span, t_eval):
+    """Validate the integration interval and the output grid."""
+    t0, tf = float(t_span[0]), float(t_span[1])
+    if tf <= t0:
+        raise ValueError("t_span must satisfy tf > t0.")
+    t_eval = np.asarray(t_eval, dtype=float)
+    if t_eval.ndim != 1 or np.any(np.diff(t_eval) < 0):
+        raise ValueError("t_eval must be a sorted one-dimensional array.")
+    if t_eval.size and (t_eval[0] < t0 or t_eval[-1] > tf):
+        raise ValueError("t_eval must lie within t_span.")
+    return t0, tf, t_eval
+
+
+def _resolve_solver(method, preset, options):
+    """Merge a preset with explicit solver settings; explicit settings win."""
+    if preset is not None:
+        if isinstance(preset, str):
+            if preset not in SOLVER_PRESETS:
+                raise ValueError(f"Unknown preset: {preset}")
+            preset = SOLVER_PRESETS[preset]
+        preset = dict(preset)
+        preset_method = preset.pop("method", None)
+        method = method or preset_method
+        options = {**preset, **options}
+    method = method or "BDF"
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    return method, options
+
+
+def _check_events(events, g_old, sol, t_old, t, y, t_events, y_events):
+    """
+    Log the event crossings of one solver step.
+
+    Crossings are appended to `t_events` and `y_events` in time order up to
+    the first terminal one. Returns the event values at `t` and the
+    ``(t, y)`` of the terminal crossing, or None if the run continues.
+    """
+    g_new = [event(t, y) for event in events]
+    for t_root, i in _find_events(events, g_old, g_new, sol, t_old, t):
+        y_root = sol(t_root)
+        t_events[i].append(t_root)
+        y_events[i].append(y_root)
+        if events[i].terminal:
+            return g_new, (t_root, y_root)
+    return g_new, None
+
+
+def _deriv_inputs(args):
+    """Phosphate and calcitriol inputs of `deriv` for its positional `args`."""
+    endpoints_p, endpoints_d = args[0], args[1]
+    p_pat, d_pat, tm = args[6], args[7], args[9]
+
+    def inputs(t):
+        return [
+            p_pat * smooth_pw(t / tm, endpoints_p),
+            d_pat * smooth_pw(t / tm, endpoints_d),
+        ]
+
+    inputs.breakpoints = tm * np.union1d(endpoints_p[0], endpoints_d[0])
+    return inputs
+
+
+def _steady_inputs(fun, args, inputs):
+    """Inputs checked by the steady-state detector; derived from `args` for `deriv`."""
+    if inputs is not None:
+        return inputs
+    if fun is not deriv or args is None:
+        raise ValueError("steady_tol requires inputs unless fun is deriv with args.")
+    return _deriv_inputs(args)
+
+
+def _inputs_flat(inputs, t_start, tf, tol, spacing):
+    """
+    Check that all input signals stay within relative `tol` of their value at `t_start`.
+
+    Inputs are sampled every `spacing` time units and at their `breakpoints`
+    (if the callable has that attribute), so short pulses are not missed.
+    """
+    times = np.linspace(t_start, tf, int(np.ceil((tf - t_start) / spacing)) + 1)
+    breakpoints = np.asarray(getattr(inputs, "breakpoints", ()), dtype=float)
+    times = np.union1d(
+        times, breakpoints[(breakpoints > t_start) & (breakpoints <= tf)]
+    )
+    u = np.asarray(inputs(times), dtype=float).reshape(-1, times.size)
+    u0 = u[:, :1]
+    return np.all(np.abs(u - u0) <= tol * np.maximum(np.abs(u0), 1e-12))
+
+
+def _check_steady(rhs, t, y, quiet_since, monitored, atol, tol, window, inputs, tf):
+    """
+    Update the steady-state detector after one solver step.
+
+    Returns the start of the current quiet period (None if the monitored
+    states are still moving) and whether the run has reached steady state.
+    """
+    dydt = np.asarray(rhs(t, y))[monitored]
+    scale = np.abs(y[monitored]) + atol
+    if np.max(np.abs(dydt) * window / scale) >= tol:
+        return None, False
+    if quiet_since is None:
+        quiet_since = t
+    steady = t - quiet_since >= window and _inputs_flat(
+        inputs, quiet_since, tf, tol, window / 4
+    )
+    return quiet_since, steady
+
+
+def run_observed(
+    fun,
+    t_span,
+    y0,
+    t_eval,
+    observables=("ipth",),
+    args=None,
+    method=None,
+    preset=None,
+    dtype=np.float64,
+    events=None,
+    steady_tol=None,
+    steady_window=24.0,
+    steady_states=None,
+    inputs=None,
+    index=None,
+    **options,
+):
+    """
+    Integrate the PTG model and record only selected observables.
+
+    Parameters
+    ----------
+    fun : callable
+        Right-hand side ``fun(t, y, *args)``, e.g. `ptg_model.model.deriv`.
+    t_span : tuple of float
+        Integration interval (t0, tf) with ``tf > t0``.
+    y0 : array_like
+        Initial state.
+    t_eval : array_like
+        Sorted output grid inside `t_span`.
+    observables : sequence, optional
+        Each entry is a state index, a name from `index`, or a callable
+        ``f(t, y) -> float`` for derived observables. Default records iPTH only.
+    args : tuple, optional
+        Extra arguments passed to `fun`.
+    method : str, optional
+        Solver name from `METHODS`. Default is 'BDF', or the method of `preset`.
+    preset : str or dict, optional
+        Scenario class from `SOLVER_PRESETS` or a dict with 'method', 'rtol'
+        and 'atol' as returned by `ptg_model.benchmark.recommend`. An explicit
+        `method` or solver option takes precedence over the preset.
+    dtype : numpy dtype, optional
+        Storage type of the output buffer, e.g. ``np.float32``.
+    events : callable or list of callables, optional
+        Event functions ``g(t, y, *args)`` as built by `threshold_event`. Integration
+        stops at the first crossing of an event with ``terminal=True``.
+    steady_tol : float, optional
+        Enable steady-state detection. The run stops once the relative change
+        ``|dydt| * steady_window / (|y| + atol)`` of the monitored states
+        stays below `steady_tol` for `steady_window` time units and all
+        `inputs` stay within relative `steady_tol` for the rest of the horizon.
+        Requires `inputs` unless `fun` is `ptg_model.model.deriv`.
+    steady_window : float, optional
+        Length of the quiet period in model time units (hours). Default is 24.
+    steady_states : sequence, optional
+        State indices or names monitored by the steady-state detector, e.g. to
+        ignore ``y[21]``/``y[22]`` when calcium is clamped. Default is all.
+    inputs : callable, optional
+        ``inputs(t)`` returning the model input signals (e.g. calcium,
+        phosphate, calcitriol) checked by the steady-state detector. It is
+        called with an array of times and is sampled every
+        ``steady_window / 4`` and at the times in its optional `breakpoints`
+        attribute. Default for `deriv` is its phosphate and calcitriol input.
+    index : dict, optional
+        Name-to-index map used to resolve state names in `observables` and
+        `steady_states`, e.g. ``AssembledModel.index`` for a model with
+        extensions. Default is `STATE_INDEX`. Events resolve names through
+        the `index` of `threshold_event`.
+    **options
+        Passed to the solver (rtol, atol, max_step, jac_sparsity, ...).
+
+    Returns
+    -------
+    OptimizeResult
+        Bunch with fields ``t`` (output times reached), ``y`` (observables,
+        shape (len(observables), len(t))), ``names``, ``t_events`` and
+        ``y_events`` (one array per event), ``t_stop`` and ``y_stop`` (time
+        and full state where the integration ended), ``nfev``, ``njev``,
+        ``nlu``, ``status`` (0 finished, 1 stopped by an event or steady
+        state, -1 failed), ``message`` and ``success``.
+    """
+    t0, tf, t_eval = _check_grid(t_span, t_eval)
+    method, options = _resolve_solver(method, preset, options)
+
+    rhs = fun if args is None else _bind_args(fun, args)
+    events = _prepare_events(events, args)
+    t_events = [[] for _ in events]
+    y_events = [[] for _ in events]
+
+    names, states, funcs = _parse_observables(observables, index)
+    out = np.empty((len(names), t_eval.size), dtype=dtype)
+
+    y0 = np.asarray(y0, dtype=float)
+    solver = METHODS[method](rhs, t0, y0, tf, **options)
+    g_old = [event(t0, y0) for event in events]
+    monitored = (
+        slice(None)
+        if steady_states is None
+        else [_state_index(spec, index) for spec in steady_states]
+    )
+    atol = np.broadcast_to(options.get("atol", 1e-6), y0.shape)[monitored]
+    if steady_tol is not None:
+        inputs = _steady_inputs(fun, args, inputs)
+    quiet_since = None
+    extra_nfev = 0
+    n_done = 0
+    status = None
+    while status is None:
+        message = solver.step()
+        if solver.status == "finished":
+            status = 0
+        elif solver.status == "failed":
+            status = -1
+            break
+
+        t_old, t_stop, y_stop = solver.t_old, solver.t, solver.y
+        sol = None
+        if events:
+            sol = solver.dense_output()
+            g_old, stop = _check_events(
+                events, g_old, sol, t_old, t_stop, y_stop, t_events, y_events
+            )
+            if stop is not None:
+                t_stop, y_stop = stop
+                status = 1
+                message = "A termination event occurred."
+
+        if status is None and steady_tol is not None:
+            extra_nfev += 1
+            quiet_since, steady = _check_steady(
+                rhs,
+                t_stop,
+                y_stop,
+                quiet_since,
+                monitored,
+                atol,
+                steady_tol,
+                steady_window,
+                inputs,
+                tf,
+            )
+            if steady:
+                status = 1
+                message = "Steady state reached."
+
+        n_next = np.searchsorted(t_eval, t_stop, side="right")
+        if n_next > n_done:
+            t_batch = t_eval[n_done:n_next]
+            if sol is None:
+                sol = solver.dense_output()
+            _record(out, n_done, t_batch, sol(t_batch), states, funcs)
+            n_done = n_next
+
+    if status == 0:
+        message = "The solver successfully reached the end of the integration interval."
+    if status == -1:
+        t_stop, y_stop = solver.t, solver.y
+
+    return OptimizeResult(
+        t=t_eval[:n_done],
+        y=out[:, :n_done],
+        names=names,
+        t_events=[np.asarray(te) for te in t_events],
+        y_events=[np.asarray(ye) for ye in y_events],
+        t_stop=t_stop,
+        y_stop=np.array(y_stop),
+        nfev=solver.nfev + extra_nfev,
+        njev=solver.njev,
+        nlu=solver.nlu,
+        status=status,
+        message=message,
+        success=status >= 0,
+    )
@@ -39,8 +39,9 @@ def smooth_pw(x, endpoints, alpha=80):
     ap = endpoints_y[0] - np.sum(cp * np.abs(beta))
     a_p = ap - np.sum(cp * beta)
     b_p = bp + np.sum(cp)
-    z = -alpha * (x - beta)
-    return a_p + b_p * x + np.sum(cp * np.log1p(np.exp(z))) * 2 / alpha
+    x = np.asarray(x)
+    z = -alpha * (x[..., np.newaxis] - beta)
+    return a_p + b_p * x + np.sum(cp * np.log1p(np.exp(z)), axis=-1) * 2 / alpha
 
 
 def smooth_pw_matrix(x, endpoints, alpha=100):
@@ -4,3 +4,57 @@ import os, sys
 PARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
 if PARENT_DIR not in sys.path:
     sys.path.insert(0, PARENT_DIR)
+
+import numpy as np
+import pytest
+from ptg_model.parameters import steady_state, steadystate_pat
+
+CONSTANT = np.array([[0, 1], [1, 1]])
+
+# Parameters of `deriv` after (t, y), in positional order.
+DERIV_ARGS = ("endpoints_p", "endpoints_d", "copt", "dopt", "popt", "c_pat", "p_pat", "d_pat", "s0", "tm", "gfr_in", "y_pat")
+
+
+@pytest.fixture(scope="session")
+def make_patient():
+    """
+    Factory for a patient at its steady state (healthy optima 5.0, 3.6, 40.0).
+
+    ``make_patient(tm, c_pat, p_pat, d_pat, pth_pat, gfr_in, endpoints_p,
+    endpoints_d)`` returns the keyword arguments of `deriv` in their positional
+    order, with 'y_pat' the 23-state initial condition, so
+    ``tuple(patient.values())`` gives the `args` of `solve_ivp`.
+    """
+    c_opt, p_opt, d_opt = 5.0, 3.6, 40.0
+    y0 = steady_state(c_opt, c_opt, d_opt)
+
+    def build(
+        tm,
+        c_pat=c_opt,
+        p_pat=p_opt,
+        d_pat=d_opt,
+        pth_pat=31.7,
+        gfr_in=1.0,
+        endpoints_p=CONSTANT,
+        endpoints_d=CONSTANT,
+    ):
+        y_pat = steadystate_pat(
+            c_pat, p_pat, d_pat, c_opt, p_opt, d_opt, pth_pat, endpoints_d, endpoints_p, gfr_in
+        )
+        args = (
+            endpoints_p,
+            endpoints_d,
+            c_opt,
+            d_opt,
+            p_opt,
+            c_pat,
+            p_pat,
+            d_pat,
+            y0[0] + y0[1],
+            tm,
+            gfr_in,
+            np.append(y_pat, [1, 1]),
+        )
+        return dict(zip(DERIV_ARGS, args))
+
+    return build
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from ptg_model.benchmark import SCENARIOS, format_table, recommend, work_precision
+from ptg_model.runner import SOLVER_PRESETS, run_observed
+
+# --- Fixtures ----------------------------------------------------------------
+
+
+@pytest.fixture(scope="module")
+def acute_rows():
+    """Small work-precision sweep on the acute calcium decline scenario."""
+    return work_precision(
+        scenarios=["acute"], methods=("BDF", "LSODA"), rtols=(1e-3, 1e-6), atols=(1e-8,)
+    )
+
+
+# --- work_precision / recommend tests ----------------------------------------
+
+
+def test_work_precision_rows(acute_rows):
+    """Each configuration yields one row with finite error and positive cost."""
+    assert len(acute_rows) == 4
+    for row in acute_rows:
+        assert row["scenario"] == "acute"
+        assert np.isfinite(row["error"]) and row["error"] >= 0
+        assert row["nfev"] > 0 and row["time"] > 0
+    errors = {(row["method"], row["rtol"]): row["error"] for row in acute_rows}
+    assert errors[("BDF", 1e-6)] < errors[("BDF", 1e-3)], "tighter rtol should be more accurate"
+
+
+def test_work_precision_counts_jacobian_calls(acute_rows):
+    """RHS calls include finite-difference Jacobians, so they exceed the solver's own count."""
+    scenario = SCENARIOS["acute"]()
+    common = (scenario["fun"], scenario["t_span"], scenario["y0"], scenario["t_eval"])
+    for row in acute_rows:
+        sol = run_observed(*common, method=row["method"], rtol=row["rtol"], atol=row["atol"])
+        if row["method"] == "LSODA":
+            assert row["nfev"] == sol.nfev
+        else:
+            assert sol.njev > 0
+            assert row["nfev"] >= sol.nfev + sol.njev * len(scenario["y0"])
+
+
+def test_recommend_picks_cheapest_accurate(acute_rows):
+    """recommend returns the cheapest configuration meeting the error target."""
+    max_error = 1e-4
+    preset = recommend(acute_rows, max_error=max_error)["acute"]
+    accurate = [row for row in acute_rows if row["error"] <= max_error]
+    cheapest = min(accurate, key=lambda row: row["nfev"])
+    assert preset == {"method": cheapest["method"], "rtol": cheapest["rtol"], "atol": cheapest["atol"]}
+    assert "acute" in format_table(acute_rows)
+
+
+def test_recommend_falls_back_to_most_accurate(acute_rows):
+    """Without any configuration meeting the target, the most accurate is used."""
+    preset = recommend(acute_rows, max_error=0.0)["acute"]
+    best = min(acute_rows, key=lambda row: row["error"])
+    assert preset["method"] == best["method"] and preset["rtol"] == best["rtol"]
+
+
+# --- runner presets -----------------------------------------------------------
+
+
+@pytest.mark.parametrize("name", sorted(SOLVER_PRESETS))
+def test_presets_cover_scenarios(name):
+    """Every preset belongs to a benchmark scenario and names a valid configuration."""
+    assert name in SCENARIOS
+    assert set(SOLVER_PRESETS[name]) == {"method", "rtol", "atol"}
+
+
+def test_run_observed_uses_preset():
+    """A preset sets the solver, explicit options override it."""
+    scenario = SCENARIOS["acute"]()
+    common = (scenario["fun"], scenario["t_span"], scenario["y0"], scenario["t_eval"])
+    with_preset = run_observed(*common, preset="acute")
+    explicit = run_observed(*common, **SOLVER_PRESETS["acute"])
+    assert with_preset.nfev == explicit.nfev
+    np.testing.assert_array_equal(with_preset.y, explicit.y)
+
+    overridden = run_observed(*common, preset="acute", method="BDF")
+    assert overridden.nfev != with_preset.nfev
+    with pytest.raises(ValueError):
+        run_observed(*common, preset="unknown")
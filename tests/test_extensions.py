@@ -0,0 +1,163 @@
+import numpy as np
+import pytest
+from ptg_model.extensions import (
+    CORE_STATES,
+    Coupling,
+    Extension,
+    assemble,
+    bone_extension,
+    calcimimetic_extension,
+)
+from ptg_model.model import deriv
+from ptg_model.runner import STATE_INDEX, run_observed, threshold_event
+
+# --- Fixtures ----------------------------------------------------------------
+
+
+@pytest.fixture(scope="module")
+def patient_args(make_patient):
+    """Healthy patient with constant inputs over 10 days."""
+    patient = make_patient(24 * 10)
+    return patient["tm"], patient["y_pat"], tuple(patient.values())
+
+
+def numeric_jacobian_pattern(fun, t, y):
+    """Nonzero pattern of a forward-difference Jacobian."""
+    f0 = fun(t, y)
+    pattern = np.zeros((y.size, y.size), dtype=bool)
+    for j in range(y.size):
+        yp = y.copy()
+        yp[j] += 1e-6 * max(abs(y[j]), 1e-2)
+        pattern[:, j] = np.abs(fun(t, yp) - f0) > 1e-10
+    return pattern
+
+
+# --- core registry tests ----------------------------------------------------------
+
+
+def test_core_registry():
+    """All 23 core states are named, and the runner resolves the same names."""
+    assert len(CORE_STATES) == len(set(CORE_STATES)) == 23
+    assert STATE_INDEX["ipth"] == 3 and STATE_INDEX["sensed_ca"] == 15
+    assert STATE_INDEX["ca_pth_factor"] == 21 and STATE_INDEX["ca_d_factor"] == 22
+
+
+@pytest.mark.parametrize("calcium_clamp", [True, False])
+def test_core_rhs_and_sparsity(patient_args, calcium_clamp):
+    """The core-only model reproduces deriv and its sparsity covers the Jacobian."""
+    _, y_pat, args = patient_args
+    model = assemble(calcium_clamp=calcium_clamp)
+    rng = np.random.default_rng(0)
+    y = y_pat * rng.uniform(0.8, 1.2, 23) + rng.uniform(0.01, 0.1, 23)
+
+    np.testing.assert_array_equal(
+        model.rhs(1.0, y, *args), deriv(1.0, y, *args, calcium_clamp=calcium_clamp)
+    )
+    pattern = numeric_jacobian_pattern(lambda t, x: model.rhs(t, x, *args), 1.0, y)
+    assert not np.any(pattern & ~model.jac_sparsity.toarray()), "sparsity misses a dependency"
+
+
+# --- extension tests --------------------------------------------------------------
+
+
+def test_assemble_layout_and_validation():
+    """Extension states are appended in order; name clashes are rejected."""
+    bone = bone_extension(ipth_ref=10.0)
+    model = assemble([calcimimetic_extension(lambda t: 0.0), bone])
+    assert model.names[23:] == ("calcimimetic_gut", "calcimimetic_plasma", "bone_turnover", "bone_mass")
+    assert model.index["bone_mass"] == 26
+    assert model.jac_sparsity.shape == (27, 27)
+    sparsity = model.jac_sparsity.toarray()
+    assert sparsity[model.index["sensed_ca"], model.index["calcimimetic_plasma"]]
+    assert sparsity[model.index["bone_turnover"], model.index["ipth"]]
+    np.testing.assert_array_equal(model.y0(np.zeros(23))[23:], [0, 0, 1, 1])
+
+    with pytest.raises(ValueError):
+        assemble([bone, bone])
+    bad = Extension("bad", ("x",), (0.0,), lambda t, y, idx, p: (0.0,), couplings=(Coupling("nope", None),))
+    with pytest.raises(ValueError):
+        assemble([bad])
+
+
+def test_coupling_only_extension(patient_args):
+    """An extension without states of its own only adds its couplings."""
+    _, y_pat, args = patient_args
+    shift = Extension(
+        "shift",
+        (),
+        (),
+        lambda t, y, idx, p: (),
+        couplings=(Coupling("sensed_ca", lambda t, y, idx, p: p["delta"]),),
+        params={"delta": 0.1},
+    )
+    model = assemble([shift])
+    assert model.names == CORE_STATES
+    np.testing.assert_array_equal(model.y0(y_pat), y_pat)
+
+    expected = deriv(1.0, y_pat, *args)
+    expected[15] += 0.1
+    np.testing.assert_allclose(model.rhs(1.0, y_pat, *args), expected)
+
+
+def test_calcimimetic_lowers_ipth(patient_args):
+    """Dosing the calcimimetic lowers iPTH; sparsity does not change the solution."""
+    tm, y_pat, args = patient_args
+    t_eval = np.linspace(0, tm, 11)
+    dosed = assemble([calcimimetic_extension(lambda t: 1.0), bone_extension(ipth_ref=y_pat[3])])
+    placebo = assemble([calcimimetic_extension(lambda t: 0.0), bone_extension(ipth_ref=y_pat[3])])
+    common = {
+        "observables": ("ipth", "bone_turnover"),
+        "index": dosed.index,
+        "args": args,
+        "rtol": 1e-6,
+        "atol": 1e-8,
+    }
+
+    on = run_observed(dosed.rhs, (0, tm), dosed.y0(y_pat), t_eval, jac_sparsity=dosed.jac_sparsity, **common)
+    dense = run_observed(dosed.rhs, (0, tm), dosed.y0(y_pat), t_eval, **common)
+    off = run_observed(placebo.rhs, (0, tm), placebo.y0(y_pat), t_eval, **common)
+
+    assert on.success and off.success
+    np.testing.assert_allclose(on.y, dense.y, rtol=1e-4)
+    np.testing.assert_allclose(off.y[0], y_pat[3], rtol=1e-3)
+    assert on.y[0, -1] < 0.9 * off.y[0, -1]
+    assert on.y[1, -1] < 1.0, "lower iPTH should lower bone turnover"
+
+
+def test_runner_resolves_extension_names(patient_args):
+    """Observables, events and steady_states accept extension state names via the model index."""
+    tm, y_pat, args = patient_args
+    model = assemble([calcimimetic_extension(lambda t: 1.0)])
+    t_eval = np.linspace(0, tm, 11)
+    event = threshold_event("calcimimetic_plasma", 5.0, direction=1, index=model.index)
+    sol = run_observed(
+        model.rhs,
+        (0, tm),
+        model.y0(y_pat),
+        t_eval,
+        observables=("calcimimetic_plasma", "sensed_ca"),
+        index=model.index,
+        args=args,
+        events=event,
+    )
+    assert sol.names == ["calcimimetic_plasma", "sensed_ca"]
+    assert sol.status == 1
+    assert np.isclose(sol.y_stop[model.index["calcimimetic_plasma"]], 5.0)
+
+    placebo = assemble([calcimimetic_extension(lambda t: 0.0)])
+    steady = run_observed(
+        placebo.rhs,
+        (0, tm),
+        placebo.y0(y_pat),
+        t_eval,
+        index=placebo.index,
+        args=args,
+        steady_tol=2e-2,
+        steady_states=("ipth", "calcimimetic_plasma"),
+        inputs=np.ones_like,
+        max_step=12.0,
+    )
+    assert steady.message == "Steady state reached."
+
+    with pytest.raises(ValueError):
+        run_observed(model.rhs, (0, tm), model.y0(y_pat), t_eval, observables=("calcimimetic_plasma",), args=args)
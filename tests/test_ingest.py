@@ -0,0 +1,193 @@
+import csv
+import gzip
+import time
+from datetime import datetime
+import numpy as np
+import pytest
+from ptg_model.ingest import _parse_time, iter_patients, read_measurements, series_endpoints
+from ptg_model.model import deriv
+from ptg_model.optimizer import optimize_schedules
+from ptg_model.utils import smooth_pw
+
+# --- Fixtures ----------------------------------------------------------------
+
+ROWS = [
+    # patient A: numeric hours, unsorted, a duplicated time and an unknown analyte
+    ("A", "0", "PTH", "500"),
+    ("A", "720", "phosphate", "5.0"),
+    ("A", "0", "phosphate", "4.0"),
+    ("A", "0", "Ca", "4.8"),
+    ("A", "1440", "pth", "600"),
+    ("A", "1440", "phosphate", "5.0"),
+    ("A", "1440", "phosphate", "6.0"),
+    ("A", "10", "albumin", "4.0"),
+    # patient B: no PTH, skipped
+    ("B", "0", "calcium", "5.0"),
+    # patient C: ISO timestamps and GFR
+    ("C", "2024-01-01T00:00:00", "pth", "300"),
+    ("C", "2024-01-02T00:00:00", "gfr", "20"),
+    ("C", "2024-01-03T00:00:00", "calcitriol", ""),
+]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["patient_id", "time", "analyte", "value"])
+        writer.writerows(rows)
+    return path
+
+
+@pytest.fixture
+def lab_csv(tmp_path):
+    """Small long-format lab export."""
+    return write_csv(tmp_path / "labs.csv", ROWS)
+
+
+# --- series_endpoints tests ----------------------------------------------------
+
+
+def test_series_endpoints_normalisation():
+    """Times are scaled by tm, values by baseline, duplicates averaged, ends held flat."""
+    endpoints = series_endpoints([10, 30, 30], [4.0, 5.0, 7.0], tm=40, baseline=4.0)
+    np.testing.assert_allclose(endpoints, [[0, 0.25, 0.75, 1], [1, 1, 1.5, 1.5]])
+    assert np.isfinite(smooth_pw(0.5, endpoints))
+
+
+def test_series_endpoints_empty():
+    """An empty series yields a constant profile."""
+    np.testing.assert_allclose(series_endpoints([], [], tm=1, baseline=1), [[0, 1], [1, 1]])
+
+
+# --- reader tests ---------------------------------------------------------------
+
+
+def test_read_measurements_filters_and_parses(lab_csv):
+    """Unknown analytes and empty values are dropped; timestamps become hours."""
+    rows = list(read_measurements(lab_csv))
+    assert all(analyte != "albumin" for _, _, analyte, _ in rows)
+    assert len(rows) == 10
+    c_times = [time for pid, time, _, _ in rows if pid == "C"]
+    assert np.isclose(c_times[1] - c_times[0], 24.0)
+
+
+@pytest.fixture
+def dst_timezone(monkeypatch):
+    """Local time zone with a DST switch on 2024-03-31."""
+    monkeypatch.setenv("TZ", "CET-1CEST,M3.5.0,M10.5.0/3")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.usefixtures("dst_timezone")
+def test_timestamps_are_utc(tmp_path):
+    """Naive timestamps are read as UTC, so a DST switch does not shorten a day."""
+    rows = [
+        ("A", "2024-03-30T12:00", "pth", "300"),
+        ("A", "2024-03-31T12:00", "pth", "310"),
+        ("A", "2024-03-31T14:00+02:00", "pth", "320"),
+    ]
+    times = [row[1] for row in read_measurements(write_csv(tmp_path / "dst.csv", rows))]
+    np.testing.assert_allclose(np.diff(times), [24.0, 0.0])
+    assert _parse_time(datetime(2024, 3, 31, 12)) == times[1]
+
+
+@pytest.mark.usefixtures("dst_timezone")
+@pytest.mark.parametrize("tz", [None, "+02:00"])
+def test_read_parquet(tmp_path, tz):
+    """Parquet timestamp columns are read like ISO strings, naive ones as UTC."""
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    times = [datetime(2024, 3, 30, 12), datetime(2024, 3, 31, 12), datetime(2024, 3, 31, 18)]
+    table = pa.table(
+        {
+            "patient_id": ["A", "A", "B"],
+            "time": pa.array(times, type=pa.timestamp("s", tz=tz)),
+            "analyte": ["PTH", "pth", "pth"],
+            "value": [300.0, None, 400.0],
+        }
+    )
+    path = tmp_path / "labs.parquet"
+    pq.write_table(table, path)
+
+    rows = list(read_measurements(path, chunksize=2))
+    assert [(pid, value) for pid, _, _, value in rows] == [("A", 300.0), ("B", 400.0)]
+    # pyarrow stores zone-aware timestamps as UTC wall time, naive ones as given.
+    assert np.isclose(rows[0][1], _parse_time("2024-03-30T12:00"))
+    assert np.isclose(rows[1][1] - rows[0][1], 30.0)
+
+
+def test_non_numeric_values_are_skipped(tmp_path):
+    """Censored results like '<5' are skipped with one warning instead of aborting the stream."""
+    rows = [("A", "0", "pth", "300"), ("A", "1", "pth", "<5"), ("A", "2", "pth", ">2000"), ("A", "3", "pth", "310")]
+    path = write_csv(tmp_path / "censored.csv", rows)
+    with pytest.warns(UserWarning, match="2 non-numeric"):
+        values = [row[3] for row in read_measurements(path)]
+    assert values == [300.0, 310.0]
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_iter_patients(lab_csv, prefetch):
+    """Patients are grouped, baselined and directly usable with deriv."""
+    with pytest.warns(UserWarning, match="B"):
+        patients = list(iter_patients(lab_csv, prefetch=prefetch))
+    assert [p["patient_id"] for p in patients] == ["A", "C"]
+
+    a = patients[0]
+    model = a["model"]
+    assert model["tm"] == 1440
+    assert model["p_pat"] == 4.5  # mean of the first month
+    assert model["c_pat"] == 4.8
+    assert model["d_pat"] == model["dopt"]
+    np.testing.assert_allclose(model["endpoints_p"], [[0, 0.5, 1], [4 / 4.5, 5 / 4.5, 5.5 / 4.5]])
+    assert model["y_pat"].shape == (23,)
+    assert np.isclose(model["y_pat"][3] / 3 * 9.434, 500)
+    np.testing.assert_allclose(a["observed"]["pth"], [[0, 1440], [500, 600]])
+
+    dydt = deriv(0.0, model["y_pat"], **model)
+    assert np.all(np.isfinite(dydt))
+
+    c = patients[1]
+    assert np.isclose(c["model"]["gfr_in"], 0.2)
+    assert c["model"]["tm"] == 24.0
+
+
+def test_iter_patients_requires_grouped_rows(tmp_path):
+    """A patient reappearing after another one raises ValueError."""
+    path = write_csv(tmp_path / "mixed.csv", [ROWS[0], ROWS[9], ROWS[4]])
+    with pytest.raises(ValueError):
+        list(iter_patients(path, prefetch=1))
+
+
+def test_iter_patients_gzip_and_early_stop(tmp_path):
+    """Gzip exports are read and stopping early releases the prefetch thread."""
+    path = tmp_path / "labs.csv.gz"
+    rows = [(f"P{k}", "0", "pth", "400") for k in range(20)]
+    with gzip.open(path, "wt", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["patient_id", "time", "analyte", "value"])
+        writer.writerows(rows)
+
+    patients = iter_patients(path, prefetch=2)
+    assert next(patients)["patient_id"] == "P0"
+    patients.close()
+
+
+def test_ingested_patient_optimises_from_rest(lab_csv):
+    """The untreated schedule of an ingested patient starts at rest, as the data does."""
+    model = next(iter_patients(lab_csv))["model"]
+    dydt_data = deriv(0.0, model["y_pat"], **model)
+
+    result = optimize_schedules(model, [(np.ones(2), np.ones(2))], max_growth=np.inf, refine_rounds=0)
+    untreated = result.front[0]
+    assert untreated["burden"] == 0
+    np.testing.assert_allclose(untreated["endpoints_p"][:, 0], model["endpoints_p"][:, 0])
+    dydt = deriv(
+        0.0,
+        model["y_pat"],
+        **{**model, "endpoints_p": untreated["endpoints_p"], "endpoints_d": untreated["endpoints_d"]},
+    )
+    assert np.max(np.abs(dydt[:21])) < 1e-3
+    np.testing.assert_allclose(dydt, dydt_data, atol=1e-8)
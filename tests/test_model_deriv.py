@@ -18,12 +18,23 @@ mock_core = SimpleNamespace(
     release_rate=lambda c, rp: 0.05 * rp * c,
 )
 
+_MOCKED = ("ptg_model.utils", "ptg_model.core_functions", "ptg_model.model")
+_saved_modules = {name: sys.modules.get(name) for name in _MOCKED}
+
 sys.modules["ptg_model.utils"] = mock_utils
 sys.modules["ptg_model.core_functions"] = mock_core
+sys.modules.pop("ptg_model.model", None)
 
 # --- Import the model after mocks are registered ---
 from ptg_model.model import deriv
 
+# --- Restore the real modules so other test files are not affected ---
+for _name, _module in _saved_modules.items():
+    if _module is None:
+        sys.modules.pop(_name, None)
+    else:
+        sys.modules[_name] = _module
+
 
 @pytest.fixture
 def base_inputs():
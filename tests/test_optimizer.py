@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from ptg_model.optimizer import (
+    optimize_schedules,
+    pareto_front,
+    pth_penalty,
+    random_schedules,
+    schedule_endpoints,
+    treatment_burden,
+)
+from ptg_model.utils import smooth_pw
+
+# --- Fixtures ----------------------------------------------------------------
+
+
+@pytest.fixture(scope="module")
+def ckd_patient(make_patient):
+    """Hyperphosphatemic, calcitriol-deficient patient with iPTH above target."""
+    patient = make_patient(24 * 30 * 3, p_pat=1.5 * 3.6, d_pat=0.5 * 40.0, pth_pat=900.0, gfr_in=0.5)
+    del patient["endpoints_p"], patient["endpoints_d"]
+    return patient
+
+
+# --- helper tests -------------------------------------------------------------
+
+
+def test_schedule_endpoints_profile():
+    """Endpoints start untreated and reproduce the knot levels."""
+    endpoints = schedule_endpoints([1.5, 2.0])
+    assert endpoints.shape == (2, 3)
+    np.testing.assert_allclose(endpoints[0], [0, 0.5, 1])
+    assert np.isclose(smooth_pw(0.5, endpoints), 1.5, atol=0.02)
+
+
+def test_burden_and_penalty():
+    """No treatment has zero burden; penalty vanishes only inside the target."""
+    assert treatment_burden(np.ones(3), np.ones(3)) == 0
+    assert np.isclose(treatment_burden(2 * np.ones(3), 0.6 * np.ones(3)), 2.0)
+    bounds = {"d_bounds": (1.2, 1.5), "p_bounds": (0.7, 0.9)}
+    assert np.isclose(treatment_burden([1.2] * 3, [0.9] * 3, **bounds), 0.0)
+    assert np.isclose(treatment_burden([1.5] * 3, [0.7] * 3, **bounds), 2.0)
+    penalty = pth_penalty([100.0, 300.0, 900.0], target=(130.0, 585.0))
+    assert penalty[1] == 0 and penalty[0] > 0 and penalty[2] > 0
+
+
+def test_pareto_front():
+    """Only non-dominated points are returned."""
+    points = [[1, 3], [2, 2], [3, 1], [3, 3], [2, 4]]
+    assert pareto_front(points) == [0, 1, 2]
+
+
+# --- optimize_schedules tests -------------------------------------------------
+
+
+def test_pruning_preserves_front(ckd_patient):
+    """Staged pruning returns the same front as evaluating every candidate fully."""
+    candidates = [(np.ones(3), np.ones(3))] + random_schedules(11, 3, seed=3)
+    staged = optimize_schedules(ckd_patient, candidates, refine_rounds=0, batch_size=4)
+    full = optimize_schedules(ckd_patient, candidates, refine_rounds=0, stages=(1.0,))
+
+    assert staged.n_pruned > 0
+    assert staged.n_evaluated + staged.n_pruned + staged.n_failed == len(candidates)
+    assert full.n_evaluated == len(candidates)
+    assert [f["burden"] for f in staged.front] == [f["burden"] for f in full.front]
+    np.testing.assert_allclose(
+        [f["control"] for f in staged.front], [f["control"] for f in full.front], rtol=1e-3
+    )
+
+
+def test_pruning_keeps_ties(make_patient):
+    """A candidate tying a front member is kept by the staged run, as by a full run."""
+    patient = make_patient(24 * 30 * 3, pth_pat=300.0)
+    del patient["endpoints_p"], patient["endpoints_d"]
+    candidates = [(np.array([1.2, 1, 1]), np.ones(3)), (np.array([1, 1.2, 1]), np.ones(3))]
+    staged = optimize_schedules(patient, candidates, refine_rounds=0, batch_size=1)
+    full = optimize_schedules(patient, candidates, refine_rounds=0, batch_size=1, stages=(1.0,))
+
+    assert staged.n_pruned == 0
+    assert len(staged.front) == len(full.front) == 2
+    assert [f["control"] for f in staged.front] == [0.0, 0.0]
+
+
+def test_process_pool_matches_in_process(ckd_patient):
+    """Evaluating in worker processes gives the same front as in-process evaluation."""
+    candidates = [(np.ones(2), np.ones(2))] + random_schedules(5, 2, seed=7)
+    serial = optimize_schedules(ckd_patient, candidates, refine_rounds=0, batch_size=3)
+    pooled = optimize_schedules(ckd_patient, candidates, refine_rounds=0, batch_size=3, workers=2)
+
+    assert (pooled.n_evaluated, pooled.n_pruned) == (serial.n_evaluated, serial.n_pruned)
+    assert [f["burden"] for f in pooled.front] == [f["burden"] for f in serial.front]
+    np.testing.assert_allclose([f["control"] for f in pooled.front], [f["control"] for f in serial.front])
+
+
+def test_front_properties(ckd_patient):
+    """The front is sorted by burden, non-dominated and respects gland growth."""
+    candidates = [(np.ones(3), np.ones(3))] + random_schedules(7, 3, seed=5)
+    result = optimize_schedules(ckd_patient, candidates, refine_rounds=1, n_neighbours=2, seed=0)
+    burdens = [f["burden"] for f in result.front]
+    controls = [f["control"] for f in result.front]
+
+    assert burdens == sorted(burdens)
+    assert len(pareto_front(np.c_[controls, burdens])) == len(result.front)
+    assert all(f["gland_growth"] <= 1.1 for f in result.front)
+    assert result.front[0]["burden"] == 0, "untreated warm start should anchor the front"
+    assert result.front[-1]["control"] < result.front[0]["control"]
@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+from scipy.integrate import solve_ivp
+from ptg_model.model import deriv
+from ptg_model.runner import run_observed, threshold_event
+from ptg_model.utils import smooth_pw
+
+# --- Fixtures ----------------------------------------------------------------
+
+
+@pytest.fixture
+def patient_args(make_patient):
+    """Healthy patient with a phosphate step over a 30-day horizon."""
+    endpoints_p = np.array([[0, 0.1, 0.2, 1], [1, 1, 1.3, 1.3]])
+    patient = make_patient(24 * 30, endpoints_p=endpoints_p)
+    return patient["tm"], patient["y_pat"], tuple(patient.values())
+
+
+# --- run_observed tests -------------------------------------------------------
+
+
+def test_run_observed_matches_solve_ivp(patient_args):
+    """Recorded states should agree with solve_ivp on the same output grid."""
+    tm, y_pat, args = patient_args
+    t_eval = np.linspace(0, tm, 11)
+    ref = solve_ivp(deriv, (0, tm), y_pat, args=args, method="BDF", rtol=1e-6, atol=1e-8, t_eval=t_eval)
+    sol = run_observed(deriv, (0, tm), y_pat, t_eval, observables=("ipth", 20), args=args, rtol=1e-6, atol=1e-8)
+
+    assert sol.success
+    assert sol.names == ["ipth", "gland_mass"]
+    np.testing.assert_allclose(sol.t, t_eval)
+    np.testing.assert_allclose(sol.y[0], ref.y[3], rtol=1e-5)
+    np.testing.assert_allclose(sol.y[1], ref.y[20], rtol=1e-5)
+
+
+def test_run_observed_buffer_shape_and_dtype(patient_args):
+    """Output buffer holds only the requested observables in the requested dtype."""
+    tm, y_pat, args = patient_args
+    t_eval = np.linspace(0, tm, 7)
+
+    def ipth_ratio(_t, y):
+        return y[3] / y_pat[3]
+
+    sol = run_observed(deriv, (0, tm), y_pat, t_eval, observables=(ipth_ratio,), args=args, dtype=np.float32)
+    assert sol.y.shape == (1, 7)
+    assert sol.y.dtype == np.float32
+    assert sol.names == ["ipth_ratio"]
+    assert np.isclose(sol.y[0, 0], 1.0)
+
+
+def test_run_observed_invalid_inputs(patient_args):
+    """Invalid grids, spans and observables raise ValueError."""
+    tm, y_pat, args = patient_args
+    with pytest.raises(ValueError):
+        run_observed(deriv, (0, tm), y_pat, [0, 2 * tm], args=args)
+    with pytest.raises(ValueError):
+        run_observed(deriv, (tm, 0), y_pat, [0], args=args)
+    with pytest.raises(ValueError):
+        run_observed(deriv, (0, tm), y_pat, [0], observables=("unknown",), args=args)
+
+
+# --- early termination tests --------------------------------------------------
+
+
+def test_threshold_event_stops_at_crossing(patient_args):
+    """A terminal threshold event stops at the crossing found by solve_ivp."""
+    tm, y_pat, args = patient_args
+    level = 1.1 * y_pat[3]
+    event = threshold_event("ipth", level, direction=1)
+    ref = solve_ivp(deriv, (0, tm), y_pat, args=args, method="BDF", rtol=1e-8, atol=1e-10, events=event)
+    sol = run_observed(
+        deriv, (0, tm), y_pat, np.linspace(0, tm, 31), args=args, events=event, rtol=1e-8, atol=1e-10
+    )
+
+    assert sol.status == 1
+    assert np.isclose(sol.t_stop, ref.t_events[0][0], rtol=1e-4)
+    assert np.isclose(sol.y_stop[3], level)
+    assert np.all(sol.t <= sol.t_stop)
+    assert len(sol.t_events[0]) == 1
+
+
+def test_non_terminal_event_is_recorded(patient_args):
+    """Non-terminal events are logged without stopping the run."""
+    tm, y_pat, args = patient_args
+    event = threshold_event(3, 1.1 * y_pat[3], terminal=False)
+    sol = run_observed(deriv, (0, tm), y_pat, np.linspace(0, tm, 31), args=args, events=[event])
+    assert sol.status == 0
+    assert len(sol.t_events[0]) >= 1
+    assert sol.t[-1] == tm
+
+
+def test_steady_state_detection(patient_args):
+    """A patient started at its steady state with constant inputs stops after one window."""
+    tm, y_pat, args = patient_args
+    endpoints_p = np.array([[0, 1], [1, 1]])
+    args = (endpoints_p,) + args[1:]
+
+    def inputs(t):
+        return smooth_pw(t / tm, endpoints_p)
+
+    sol = run_observed(
+        deriv,
+        (0, tm),
+        y_pat,
+        np.linspace(0, tm, 31),
+        args=args,
+        steady_tol=2e-2,
+        steady_window=24.0,
+        inputs=inputs,
+        max_step=12.0,
+    )
+    assert sol.status == 1
+    assert sol.message == "Steady state reached."
+    assert 24.0 <= sol.t_stop < tm
+    assert sol.t[-1] <= sol.t_stop
+    np.testing.assert_allclose(sol.y_stop[3], y_pat[3], rtol=1e-3)
+
+
+def test_steady_state_waits_for_inputs(patient_args):
+    """A pending phosphate step prevents a premature steady-state stop."""
+    tm, y_pat, args = patient_args
+    endpoints_p = np.array([[0, 0.5, 0.6, 1], [1, 1, 1.3, 1.3]])
+    args = (endpoints_p,) + args[1:]
+
+    def inputs(t):
+        return smooth_pw(t / tm, endpoints_p)
+
+    sol = run_observed(
+        deriv,
+        (0, tm),
+        y_pat,
+        np.linspace(0, tm, 31),
+        args=args,
+        steady_tol=2e-2,
+        steady_window=24.0,
+        inputs=inputs,
+        max_step=12.0,
+    )
+    assert sol.t_stop > 0.6 * tm
+
+
+def test_steady_state_inputs_default_to_deriv_args(patient_args):
+    """Without explicit inputs, deriv's phosphate and calcitriol profiles are checked."""
+    tm, y_pat, args = patient_args
+    endpoints_p = np.array([[0, 0.49, 0.5, 1], [1, 1, 1.3, 1.3]])
+    args = (endpoints_p,) + args[1:]
+    sol = run_observed(
+        deriv, (0, tm), y_pat, np.linspace(0, tm, 31), args=args, steady_tol=2e-2, max_step=12.0
+    )
+    assert sol.t_stop > 0.5 * tm
+
+    with pytest.raises(ValueError):
+        run_observed(lambda t, y: deriv(t, y, *args), (0, tm), y_pat, [0], steady_tol=2e-2)
+
+
+def test_steady_state_sees_short_pulses(patient_args):
+    """Input breakpoints are sampled, so a pulse much shorter than the window is not missed."""
+    tm, y_pat, args = patient_args
+    args = (np.array([[0, 1], [1, 1]]),) + args[1:]
+
+    def inputs(t):
+        return 1.0 + 0.5 * (np.abs(np.asarray(t) - 500.0) <= 0.5)
+
+    inputs.breakpoints = [499.5, 500.5]
+    sol = run_observed(
+        deriv,
+        (0, tm),
+        y_pat,
+        np.linspace(0, tm, 31),
+        args=args,
+        steady_tol=2e-2,
+        inputs=inputs,
+        max_step=12.0,
+    )
+    assert sol.t_stop > 500.0
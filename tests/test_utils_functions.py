@@ -32,6 +32,15 @@ def test_smooth_pw_vectorized_behavior(simple_endpoints):
     assert np.ptp(y_vals) > 0, "Output range should not be zero"
 
 
+def test_smooth_pw_array_matches_scalar(simple_endpoints):
+    """Array input should give the same values as element-wise scalar calls."""
+    x_vals = np.linspace(-0.5, 2.5, 30)
+    expected = [smooth_pw(float(x), simple_endpoints) for x in x_vals]
+    np.testing.assert_allclose(smooth_pw(x_vals, simple_endpoints), expected, rtol=1e-14)
+    grid = x_vals.reshape(3, -1)
+    assert smooth_pw(grid, simple_endpoints).shape == grid.shape
+
+
 # --- stim tests ---------------------------------------------------------------
 
 